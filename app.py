@@ -1,16 +1,148 @@
 
+import os
+
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.express as px
+import pyarrow as pa
+import pyarrow.csv as pacsv
 
 st.set_page_config(page_title="E‑Mobility Sales & Ops Dashboard", layout="wide")
 
+FILTER_COLS = ["region", "country", "product", "sales_rep", "channel", "segment"]
+MAX_TABLE_ROWS = 10_000
+# Caches keyed on filter selections hold a frame, CSV or figure per combination: keep them bounded
+MAX_CACHE_ENTRIES = 32
+
 @st.cache_data
-def load_data():
-    df = pd.read_csv("sales_ebus_sample.csv", parse_dates=["date"])
+def load_data(path="sales_ebus_sample.csv"):
+    # The sales CSV is parsed only when its Parquet copy is missing or older than it
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(path):
+        raw = pd.read_csv(path, parse_dates=["date"])
+        # Compact dtypes before writing; revenue stays float64 for exact totals
+        for c in raw.select_dtypes("float").columns.drop("revenue_usd"):
+            raw[c] = raw[c].astype(np.float32)
+        for c in raw.select_dtypes("integer").columns:
+            raw[c] = pd.to_numeric(raw[c], downcast="integer")
+        for c in FILTER_COLS:
+            raw[c] = raw[c].astype("category")
+        # Write to a temp file and swap it in, so a partial write never passes as fresh
+        tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+        try:
+            raw.to_parquet(tmp_path, compression="zstd")
+            os.replace(tmp_path, parquet_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    # Categories come back dictionary-encoded and the measures keep their compact dtypes
+    df = pd.read_parquet(parquet_path, engine="pyarrow")
+    # Sorted dates let the date filter be a searchsorted slice instead of a mask
+    df = df.sort_values("date", kind="stable").reset_index(drop=True)
     return df
 
+@st.cache_data
+def filter_options(_df):
+    return {c: _df[c].cat.categories.tolist() for c in FILTER_COLS}
+
+@st.cache_data
+def category_codes(_df):
+    # Category -> code lookups built once, instead of hashing the categories on every filter
+    return {c: {v: i for i, v in enumerate(_df[c].cat.categories)} for c in FILTER_COLS}
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def apply_filters(_df, d0, d1, regions, countries, products, reps, channels, segments):
+    # The date range is a contiguous slice of the date-sorted frame
+    dates = _df["date"].values
+    start = np.datetime64(d0, "D")
+    end = np.datetime64(d1, "D") + np.timedelta64(1, "D")
+    lo, hi = np.searchsorted(dates, [start, end], side="left")
+    sub = _df.iloc[lo:hi]
+
+    # Region always applies; the other filters only when something is selected
+    active = [("region", regions)] + [
+        (c, sel)
+        for c, sel in [("country", countries), ("product", products), ("sales_rep", reps), ("channel", channels), ("segment", segments)]
+        if sel
+    ]
+    cat_to_code = category_codes(_df)
+    mask = np.ones(len(sub), dtype=bool)
+    for c, sel in active:
+        col = sub[c].cat
+        wanted = np.fromiter((cat_to_code[c][x] for x in sel if x in cat_to_code[c]), dtype=np.intp)
+        # Keep-table indexed by category code; the extra last slot (code -1, missing) stays False
+        keep = np.zeros(len(col.categories) + 1, dtype=bool)
+        keep[wanted] = True
+        np.logical_and(mask, keep[col.codes.to_numpy()], out=mask)
+
+    # Gather the matching rows by position
+    return sub.take(np.flatnonzero(mask))
+
+# Aggregations are cached on the filter key; the frame itself is passed unhashed
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def kpis(filter_key, _f):
+    return dict(
+        revenue=_f["revenue_usd"].sum(),
+        units=int(_f["units_sold"].sum()),
+        avg_uptime=_f["fleet_uptime"].mean(),
+        avg_battery=_f["battery_health"].mean(),
+        co2_saved=_f["co2_saved_tons"].sum(),
+    )
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def weekly_revenue(filter_key, _f):
+    return _f.set_index("date")["revenue_usd"].resample("W").sum().reset_index()
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def product_totals(filter_key, _f):
+    # One GroupBy shared by every product chart
+    g_prod = _f.groupby("product", observed=True, sort=False)
+    prod = g_prod["revenue_usd"].sum().sort_values(ascending=False).head(10).reset_index()
+    prod_units = g_prod["units_sold"].sum().sort_values(ascending=False).reset_index()
+    return prod, prod_units
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def revenue_by(filter_key, _f, col):
+    return _f.groupby(col, observed=True, sort=False)["revenue_usd"].sum().sort_values(ascending=False).reset_index()
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def to_csv_bytes(filter_key, _f):
+    # Written by pyarrow, which formats whole columns at a time
+    table = pa.Table.from_pandas(_f, preserve_index=False)
+    # Dates carry no time of day; write them as plain dates like the source CSV
+    table = table.set_column(table.schema.get_field_index("date"), "date", table["date"].cast(pa.date32()))
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(table, buf)
+    return buf.getvalue().to_pybytes()
+
+# Figures are cached on the filter key too, so unchanged selections skip the Plotly build
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def trend_fig(filter_key, _ts):
+    return px.line(_ts, x="date", y="revenue_usd", markers=True, labels={"revenue_usd": "Revenue (USD)", "date": "Week"})
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def top_products_fig(filter_key, _prod):
+    return px.bar(_prod, x="product", y="revenue_usd", labels={"revenue_usd": "Revenue (USD)", "product": "Product"})
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def units_fig(filter_key, _prod_units):
+    return px.bar(_prod_units, x="product", y="units_sold", labels={"units_sold": "Units", "product": "Product"})
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def share_fig(filter_key, _prod):
+    return px.pie(_prod, names="product", values="revenue_usd")
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def region_fig(filter_key, _reg):
+    return px.bar(_reg, x="revenue_usd", y="region", orientation="h", labels={"revenue_usd": "Revenue (USD)", "region": "Region"})
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def rep_fig(filter_key, _rep):
+    return px.bar(_rep, x="sales_rep", y="revenue_usd", labels={"revenue_usd": "Revenue (USD)", "sales_rep": "Sales rep"})
+
 df = load_data()
+opts = filter_options(df)
 
 # Sidebar Filters
 st.sidebar.title("Filters")
@@ -18,110 +150,111 @@ min_date = df["date"].min()
 max_date = df["date"].max()
 date_range = st.sidebar.date_input("Date range", [min_date, max_date])
 
-regions = st.sidebar.multiselect("Region", sorted(df["region"].unique()), default=sorted(df["region"].unique()))
-countries = st.sidebar.multiselect("Country", sorted(df["country"].unique()))
-products = st.sidebar.multiselect("Product", sorted(df["product"].unique()))
-reps = st.sidebar.multiselect("Sales rep", sorted(df["sales_rep"].unique()))
-channels = st.sidebar.multiselect("Channel", sorted(df["channel"].unique()))
-segments = st.sidebar.multiselect("Segment", sorted(df["segment"].unique()))
-
-# Apply filters
-mask = (
-    (df["date"] >= pd.to_datetime(date_range[0])) &
-    (df["date"] <= pd.to_datetime(date_range[-1])) &
-    (df["region"].isin(regions))
-)
+regions = st.sidebar.multiselect("Region", opts["region"], default=opts["region"])
+countries = st.sidebar.multiselect("Country", opts["country"])
+products = st.sidebar.multiselect("Product", opts["product"])
+reps = st.sidebar.multiselect("Sales rep", opts["sales_rep"])
+channels = st.sidebar.multiselect("Channel", opts["channel"])
+segments = st.sidebar.multiselect("Segment", opts["segment"])
 
-if countries:
-    mask &= df["country"].isin(countries)
-if products:
-    mask &= df["product"].isin(products)
-if reps:
-    mask &= df["sales_rep"].isin(reps)
-if channels:
-    mask &= df["channel"].isin(channels)
-if segments:
-    mask &= df["segment"].isin(segments)
-
-f = df.loc[mask].copy()
-
-# KPIs
-total_revenue = f["revenue_usd"].sum()
-units = f["units_sold"].sum()
-avg_uptime = f["fleet_uptime"].mean()
-avg_battery = f["battery_health"].mean()
-co2_saved = f["co2_saved_tons"].sum()
+# Apply filters; the key holds only hashable selections so unchanged filters hit the cache
+filter_key = (
+    date_range[0], date_range[-1],
+    tuple(sorted(regions)), tuple(sorted(countries)), tuple(sorted(products)),
+    tuple(sorted(reps)), tuple(sorted(channels)), tuple(sorted(segments)),
+)
+f = apply_filters(df, *filter_key)
 
 st.title("E‑Mobility Sales and Operations Dashboard")
 st.caption("Sample portfolio dashboard for demonstration with synthetic data.")
 
-k1, k2, k3, k4, k5 = st.columns(5)
-k1.metric("Revenue (USD)", f"{total_revenue:,.0f}")
-k2.metric("Units sold", int(units))
-k3.metric("Avg fleet uptime", f"{avg_uptime*100:,.1f}%")
-k4.metric("Avg battery health", f"{avg_battery*100:,.1f}%")
-k5.metric("CO₂ saved (tons)", f"{co2_saved:,.1f}")
+def kpi_row():
+    k = kpis(filter_key, f)
+    k1, k2, k3, k4, k5 = st.columns(5)
+    k1.metric("Revenue (USD)", f"{k['revenue']:,.0f}")
+    k2.metric("Units sold", k["units"])
+    k3.metric("Avg fleet uptime", f"{k['avg_uptime']*100:,.1f}%")
+    k4.metric("Avg battery health", f"{k['avg_battery']*100:,.1f}%")
+    k5.metric("CO₂ saved (tons)", f"{k['co2_saved']:,.1f}")
 
-# Charts
-tab1, tab2, tab3, tab4 = st.tabs(["Trends", "By Product", "By Region and Rep", "Data"])
+kpi_row()
 
-with tab1:
+def trends_tab():
     st.subheader("Revenue trend")
-    ts = f.groupby(pd.Grouper(key="date", freq="W"))["revenue_usd"].sum().reset_index()
+    ts = weekly_revenue(filter_key, f)
     if not ts.empty:
-        fig = px.line(ts, x="date", y="revenue_usd", markers=True, labels={"revenue_usd": "Revenue (USD)", "date": "Week"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(trend_fig(filter_key, ts), use_container_width=True)
     else:
         st.info("No data for the current filters.")
 
-with tab2:
+def products_tab():
+    prod, prod_units = product_totals(filter_key, f)
+
     st.subheader("Top products by revenue")
-    prod = f.groupby("product", as_index=False)["revenue_usd"].sum().sort_values("revenue_usd", ascending=False).head(10)
     if not prod.empty:
-        fig = px.bar(prod, x="product", y="revenue_usd", labels={"revenue_usd": "Revenue (USD)", "product": "Product"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(top_products_fig(filter_key, prod), use_container_width=True)
     else:
         st.info("No data for the current filters.")
 
     c1, c2 = st.columns(2)
     with c1:
         st.subheader("Units sold by product")
-        prod_units = f.groupby("product", as_index=False)["units_sold"].sum().sort_values("units_sold", ascending=False)
         if not prod_units.empty:
-            figu = px.bar(prod_units, x="product", y="units_sold", labels={"units_sold": "Units", "product": "Product"})
-            st.plotly_chart(figu, use_container_width=True)
+            st.plotly_chart(units_fig(filter_key, prod_units), use_container_width=True)
         else:
             st.info("No data for the current filters.")
     with c2:
         st.subheader("Revenue share")
-        share = prod.copy()
-        if not share.empty:
-            figp = px.pie(share, names="product", values="revenue_usd")
-            st.plotly_chart(figp, use_container_width=True)
+        if not prod.empty:
+            st.plotly_chart(share_fig(filter_key, prod), use_container_width=True)
         else:
             st.info("No data for the current filters.")
 
-with tab3:
+def region_rep_tab():
     st.subheader("Revenue by region")
-    reg = f.groupby("region", as_index=False)["revenue_usd"].sum().sort_values("revenue_usd", ascending=False)
+    reg = revenue_by(filter_key, f, "region")
     if not reg.empty:
-        fig = px.bar(reg, x="revenue_usd", y="region", orientation="h", labels={"revenue_usd": "Revenue (USD)", "region": "Region"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(region_fig(filter_key, reg), use_container_width=True)
     else:
         st.info("No data for the current filters.")
 
     st.subheader("Sales rep performance")
-    rep = f.groupby("sales_rep", as_index=False)["revenue_usd"].sum().sort_values("revenue_usd", ascending=False)
+    rep = revenue_by(filter_key, f, "sales_rep")
     if not rep.empty:
-        fig = px.bar(rep, x="sales_rep", y="revenue_usd", labels={"revenue_usd": "Revenue (USD)", "sales_rep": "Sales rep"})
-        st.plotly_chart(fig, use_container_width=True)
+        st.plotly_chart(rep_fig(filter_key, rep), use_container_width=True)
     else:
         st.info("No data for the current filters.")
 
-with tab4:
+# The table toggle reruns only this fragment, which reads the filters from session state
+st.session_state["filtered"] = f
+st.session_state["filter_key"] = filter_key
+
+@st.fragment
+def data_tab():
+    f = st.session_state["filtered"]
+    filter_key = st.session_state["filter_key"]
     st.subheader("Filtered dataset")
-    st.dataframe(f.sort_values("date", ascending=False), use_container_width=True)
-    st.download_button("Download filtered CSV", data=f.to_csv(index=False), file_name="filtered_sales.csv", mime="text/csv")
+    # Rendered on demand; f is date-sorted, so newest-first is a reversed view
+    if st.toggle("Show table"):
+        st.dataframe(f.iloc[::-1].head(MAX_TABLE_ROWS), use_container_width=True)
+        if len(f) > MAX_TABLE_ROWS:
+            st.caption(f"Showing the latest {MAX_TABLE_ROWS:,} of {len(f):,} rows. Download the CSV for the full set.")
+    st.download_button("Download filtered CSV", data=to_csv_bytes(filter_key, f), file_name="filtered_sales.csv", mime="text/csv")
+
+# Charts
+tab1, tab2, tab3, tab4 = st.tabs(["Trends", "By Product", "By Region and Rep", "Data"])
+
+with tab1:
+    trends_tab()
+
+with tab2:
+    products_tab()
+
+with tab3:
+    region_rep_tab()
+
+with tab4:
+    data_tab()
 
 with st.expander("About this demo"):
     st.markdown(
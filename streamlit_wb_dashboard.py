@@ -1,10 +1,10 @@
-\"\"\"
+"""
 Streamlit dashboard: World Bank WDI sample dashboard
 File: streamlit_wb_dashboard.py
 To run:
-    pip install streamlit pandas numpy plotly scikit-learn
+    pip install streamlit pandas numpy plotly scikit-learn pyarrow
     streamlit run streamlit_wb_dashboard.py --server.port 8501
-\"\"\"
+"""
 
 import streamlit as st
 import pandas as pd
@@ -13,65 +13,187 @@ import plotly.express as px
 import plotly.graph_objects as go
 from sklearn.linear_model import LinearRegression
 from io import BytesIO
+import itertools
+import os
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+st.set_page_config(layout="wide", page_title="World Bank WDI Dashboard")
+
+# Entries kept per selection-keyed cache (indicator blocks, figures, CSV exports)
+MAX_CACHE_ENTRIES = 32
 
 @st.cache_data
 def load_data(path):
-    df = pd.read_csv(path)
-    return df
+    # Reruns and restarts read the Parquet file next to the WDI CSV, rebuilt when the CSV changes
+    parquet_path = os.path.splitext(path)[0] + ".parquet"
+    if not os.path.exists(parquet_path) or os.path.getmtime(parquet_path) < os.path.getmtime(path):
+        # Pin year columns to float64 and text labels to strings; other columns are inferred
+        probe = pd.read_csv(path, nrows=1000)
+        dtype = {c: 'float64' for c in probe.columns if c.isdigit()}
+        dtype.update({c: 'string' for c in probe.columns if c not in dtype and probe[c].dtype == object})
+        # Stream chunks into a temp file, swapped in only once it is complete
+        tmp_path = f"{parquet_path}.{os.getpid()}.tmp"
+        chunks = pd.read_csv(path, dtype=dtype, chunksize=500_000)
+        first = next(chunks, None)
+        try:
+            if first is None:
+                # Header-only CSV: an empty file with the probe's columns
+                probe.astype(dtype).to_parquet(tmp_path, compression='zstd')
+            else:
+                schema = pa.Table.from_pandas(first, preserve_index=False).schema
+                try:
+                    with pq.ParquetWriter(tmp_path, schema, compression='zstd') as writer:
+                        for chunk in itertools.chain([first], chunks):
+                            writer.write_table(pa.Table.from_pandas(chunk, preserve_index=False).cast(schema))
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError, pa.ArrowTypeError):
+                    # A later chunk inferred a type the first one can't hold: parse the file in one go
+                    pd.read_csv(path, dtype=dtype).to_parquet(tmp_path, compression='zstd')
+            os.replace(tmp_path, parquet_path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    df = pd.read_parquet(parquet_path, engine="pyarrow", dtype_backend="pyarrow")
+    # Country / indicator labels repeat on every row: store them as categories
+    for c in df.select_dtypes(include='string').columns:
+        df[c] = df[c].astype('category')
 
-df = load_data("/mnt/data/WB_WDI_WIDEF.csv")
+    # Column roles, detected once through a lowercase name -> column map
+    cols_lower = {c.lower(): c for c in df.columns}
+    meta = {'cols_lower': cols_lower}
+    # Heuristic: find a 'year' column or wide format where years are columns
+    meta['year_col'] = cols_lower.get('year')
+    meta['year_mode'] = 'long' if meta['year_col'] else 'wide'
 
-st.set_page_config(layout="wide", page_title="World Bank WDI Dashboard")
+    # Try to detect a country column
+    country_col = next(
+        (cols_lower[n] for n in ['country', 'country_name', 'countryname', 'country name', 'country_name '] if n in cols_lower),
+        None,
+    )
+    # Fallback: take the first text column
+    if country_col is None:
+        text_cols = df.select_dtypes(include=['object', 'string', 'category']).columns
+        country_col = text_cols[0] if len(text_cols) else None
+    meta['country_col'] = country_col
+    meta['countries'] = sorted(df[country_col].dropna().unique().tolist()) if country_col else []
+
+    # WDI-style wide files hold one indicator per row, named in an indicator column
+    indicator_col = next(
+        (cols_lower[n] for n in ['indicator name', 'indicator_name', 'indicatorname', 'indicator', 'series name'] if n in cols_lower),
+        None,
+    )
+    meta['indicator_col'] = indicator_col
+    meta['indicators'] = sorted(df[indicator_col].dropna().unique().tolist()) if indicator_col else []
+
+    # Identify numeric indicator columns (exclude country and any 'indicator' textual columns)
+    meta['numeric_cols'] = df.select_dtypes(include=[np.number]).columns.tolist()
+
+    # Year columns in wide format (e.g. '1960', '1961', ...), and the years available for the slider
+    meta['year_str_cols'] = [c for c in df.columns if c.isdigit()]
+    meta['year_of_col'] = {c: int(c) for c in meta['year_str_cols']}
+    meta['year_int_cols'] = sorted(meta['year_of_col'].values())
+    if meta['year_mode'] == 'wide':
+        meta['years'] = meta['year_int_cols']
+    else:
+        meta['years'] = sorted(df[meta['year_col']].dropna().unique().astype(int).tolist())
+    return df, meta
+
+@st.cache_data
+def load_long(path):
+    # Wide year columns melted to long form once, instead of on every rerun
+    df, meta = load_data(path)
+    year_cols = meta['year_str_cols']
+    id_cols = [c for c in df.columns if c not in year_cols]
+    long = df.melt(id_vars=id_cols, value_vars=year_cols, var_name='Year', value_name='value')
+    long = long.dropna(subset=['value'])
+    long['Year'] = long['Year'].astype('int16')
+    long['value'] = long['value'].astype('float32')
+    return long
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def indicator_block(inds, filter_key, _df_f):
+    # Complete rows of the selected indicators as one float32 matrix
+    X = _df_f[list(inds)].to_numpy(dtype=np.float32, na_value=np.nan)
+    return X[~np.isnan(X).any(axis=1)]
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def corr_block(inds, filter_key, _df_f):
+    # Pearson correlation from one centred matrix product instead of pandas' pairwise loop
+    X = indicator_block(inds, filter_key, _df_f)
+    Xc = X - X.mean(axis=0)
+    s = Xc.std(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (Xc.T @ Xc) / (len(X) * np.outer(s, s))
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def scatter_matrix_sample(inds, filter_key, _df_f, n=1000):
+    # Unbiased fixed-seed sample of complete rows, drawn as indices into the cached block
+    X = indicator_block(inds, filter_key, _df_f)
+    sample = np.random.default_rng(0).choice(len(X), size=min(n, len(X)), replace=False)
+    return pd.DataFrame(X[np.sort(sample)], columns=list(inds))
+
+# Figures are cached on the selections that produced their data, which is passed unhashed
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def time_series_fig(indicator, indicator_col, countries, year_range, country_col, value_col, _ts_df):
+    return px.line(_ts_df, x='Year', y=value_col, color=country_col, markers=True, labels={value_col: indicator}, title=f"{indicator} over time")
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def fit_line(x_indicator, y_indicator, filter_key, _scatter_df):
+    # Least-squares slope and intercept; very large selections are fitted on a fixed-seed sample
+    x = _scatter_df[x_indicator].to_numpy(dtype=np.float64)
+    y = _scatter_df[y_indicator].to_numpy(dtype=np.float64)
+    if len(x) > 100_000:
+        sample = np.random.default_rng(0).choice(len(x), size=100_000, replace=False)
+        x, y = x[sample], y[sample]
+    m = LinearRegression().fit(x.reshape(-1, 1), y)
+    return m.coef_[0], m.intercept_
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def scatter_fig(x_indicator, y_indicator, filter_key, country_col, _scatter_df):
+    fig = px.scatter(_scatter_df, x=x_indicator, y=y_indicator, hover_data=[country_col], title=f"{y_indicator} vs {x_indicator}")
+    # The regression line only needs its two endpoints
+    a, b = fit_line(x_indicator, y_indicator, filter_key, _scatter_df)
+    x0, x1 = _scatter_df[x_indicator].min(), _scatter_df[x_indicator].max()
+    fig.add_trace(go.Scatter(x=[x0, x1], y=[a * x0 + b, a * x1 + b], mode='lines', name='OLS trendline', showlegend=False))
+    return fig
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def heatmap_fig(inds, filter_key, _df_f):
+    corr = corr_block(inds, filter_key, _df_f)
+    fig_hm = go.Figure(data=go.Heatmap(z=corr, x=list(inds), y=list(inds), colorbar=dict(title='corr')))
+    fig_hm.update_layout(title='Indicator correlation heatmap')
+    return fig_hm
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def scatter_matrix_fig(inds, filter_key, _df_f):
+    sm_df = scatter_matrix_sample(inds, filter_key, _df_f)
+    return px.scatter_matrix(sm_df, dimensions=list(inds), title='Pairwise scatter matrix (sample up to 1000 rows)')
+
+@st.cache_data(max_entries=MAX_CACHE_ENTRIES)
+def to_csv_bytes(filter_key, _df_f):
+    buf = pa.BufferOutputStream()
+    pacsv.write_csv(pa.Table.from_pandas(_df_f, preserve_index=False), buf)
+    return buf.getvalue().to_pybytes()
+
+DATA_PATH = "/mnt/data/WB_WDI_WIDEF.csv"
+df, meta = load_data(DATA_PATH)
 
 st.title("World Bank WDI — Sample Dashboard")
 st.markdown("Interactive dashboard built with Streamlit. Filters on the left.")
 
-# Attempt to identify columns for country, year and indicators
-possible_country_cols = [c for c in df.columns if c.lower() in ['country', 'country_name', 'countryname', 'country code', 'iso3c', 'iso2c']]
-possible_year_cols = [c for c in df.columns if c.lower() in ['year']]
-# Heuristic: find a 'year' column or wide format where years are columns
-if 'year' in df.columns.str.lower().tolist() or 'Year' in df.columns:
-    year_mode = 'long'
-else:
-    year_mode = 'wide'
-
-# Try to detect a country column
-country_col = None
-for c in df.columns:
-    if c.lower() in ['country', 'country_name', 'countryname', 'country name', 'country_name ' ,'Country']:
-        country_col = c
-        break
-# Fallback: take the first non-numeric column
-if country_col is None:
-    for c in df.columns:
-        if df[c].dtype == object:
-            country_col = c
-            break
-
-# Identify numeric indicator columns (exclude country and any 'indicator' textual columns)
-numeric_cols = df.select_dtypes(include=[np.number]).columns.tolist()
+# Columns for country, year and indicators, detected once by load_data
+year_mode = meta['year_mode']
+country_col = meta['country_col']
+numeric_cols = meta['numeric_cols']
 
 # Sidebar: filters
 st.sidebar.header("Filters")
-countries = sorted(df[country_col].dropna().unique().tolist()) if country_col else []
+countries = meta['countries']
 selected_countries = st.sidebar.multiselect("Select countries", countries, default=countries[:5])
 
-# Year selection (if wide, try to detect years as integer-like column names)
-year_cols = []
-if year_mode == 'wide':
-    # pick numeric-like column names (e.g. '1960', '1961', ...)
-    for c in df.columns:
-        try:
-            int(c)
-            year_cols.append(int(c))
-        except Exception:
-            pass
-    year_cols = sorted(year_cols)
-else:
-    if 'Year' in df.columns:
-        year_cols = sorted(df['Year'].dropna().unique().astype(int).tolist())
-    elif 'year' in df.columns:
-        year_cols = sorted(df['year'].dropna().unique().astype(int).tolist())
+# Year selection: year-named columns in wide format, values of the year column in long format
+year_cols = meta['years']
 
 if year_cols:
     min_y, max_y = min(year_cols), max(year_cols)
@@ -79,9 +201,11 @@ if year_cols:
 else:
     selected_year_range = None
 
-# Indicator selectors
+# Indicator selectors; in wide files with an indicator column the time series picks an indicator by name
 indicator_options = numeric_cols
-selected_indicator = st.sidebar.selectbox("Primary indicator (time series)", indicator_options, index=0 if indicator_options else None)
+wide_indicators = year_mode == 'wide' and meta['indicator_col'] is not None
+ts_options = meta['indicators'] if wide_indicators else indicator_options
+selected_indicator = st.sidebar.selectbox("Primary indicator (time series)", ts_options, index=0 if ts_options else None)
 x_indicator = st.sidebar.selectbox("X for scatter", indicator_options, index=1 if len(indicator_options) > 1 else 0)
 y_indicator = st.sidebar.selectbox("Y for scatter", indicator_options, index=2 if len(indicator_options) > 2 else 0)
 heatmap_inds = st.sidebar.multiselect("Indicators for correlation heatmap (up to 12)", indicator_options, default=indicator_options[:6])
@@ -93,18 +217,26 @@ if country_col:
         df_f = df_f[df_f[country_col].isin(selected_countries)]
 if selected_year_range and year_cols:
     if year_mode == 'long':
-        if 'Year' in df_f.columns:
-            df_f = df_f[(df_f['Year'] >= selected_year_range[0]) & (df_f['Year'] <= selected_year_range[1])]
-        elif 'year' in df_f.columns:
-            df_f = df_f[(df_f['year'] >= selected_year_range[0]) & (df_f['year'] <= selected_year_range[1])]
+        ycol = meta['year_col']
+        df_f = df_f[(df_f[ycol] >= selected_year_range[0]) & (df_f[ycol] <= selected_year_range[1])]
     else:
         # For wide mode, we'll melt only the numeric year columns for time-series visuals
         pass
 
+# Cache key for df_f: sorted countries, plus the year range only where it filters rows
+filter_key = (tuple(sorted(selected_countries)), selected_year_range if year_mode == 'long' else None)
+
 # Main layout: KPIs
 kpi1, kpi2, kpi3 = st.columns(3)
+series = None
 if selected_indicator and selected_indicator in df_f.columns:
     series = df_f[selected_indicator].dropna()
+elif selected_indicator and wide_indicators:
+    # The selected indicator's rows, across the year columns in range
+    in_range = [c for c, y in meta['year_of_col'].items() if not selected_year_range or selected_year_range[0] <= y <= selected_year_range[1]]
+    rows = df_f.loc[df_f[meta['indicator_col']] == selected_indicator, in_range]
+    series = pd.Series(rows.to_numpy(dtype=np.float64, na_value=np.nan).ravel()).dropna()
+if series is not None:
     kpi1.metric("Mean", f"{series.mean():,.2f}" if not series.empty else "n/a")
     kpi2.metric("Median", f"{series.median():,.2f}" if not series.empty else "n/a")
     kpi3.metric("Max", f"{series.max():,.2f}" if not series.empty else "n/a")
@@ -116,21 +248,23 @@ st.markdown("---")
 # Time series: if data is long format or we can melt wide-year columns
 st.subheader("Time series — Primary indicator")
 ts_df = None
-if year_mode == 'long' and ('Year' in df.columns or 'year' in df.columns):
-    ycol = 'Year' if 'Year' in df.columns else 'year'
+if year_mode == 'long':
+    ycol = meta['year_col']
     ts_df = df_f[[country_col, ycol, selected_indicator]].dropna()
     ts_df = ts_df.rename(columns={ycol: 'Year'})
-else:
-    # melt year columns that look numeric
-    year_str_cols = [c for c in df.columns if c.isdigit()]
-    if year_str_cols:
-        ts_df = df_melt = df_f.melt(id_vars=[country_col], value_vars=year_str_cols, var_name='Year', value_name=selected_indicator)
-        ts_df['Year'] = ts_df['Year'].astype(int)
-        ts_df = ts_df.dropna(subset=[selected_indicator])
+    value_col = selected_indicator
+elif meta['year_str_cols']:
+    # Pre-melted year columns, narrowed to the selected indicator
+    ts_df = load_long(DATA_PATH)
+    if meta['indicator_col']:
+        ts_df = ts_df[ts_df[meta['indicator_col']] == selected_indicator]
+    if selected_countries:
+        ts_df = ts_df[ts_df[country_col].isin(selected_countries)]
+    value_col = 'value'
 if ts_df is not None and not ts_df.empty:
     if selected_year_range:
         ts_df = ts_df[(ts_df['Year'] >= selected_year_range[0]) & (ts_df['Year'] <= selected_year_range[1])]
-    fig = px.line(ts_df, x='Year', y=selected_indicator, color=country_col, markers=True, title=f"{selected_indicator} over time")
+    fig = time_series_fig(selected_indicator, meta['indicator_col'], filter_key[0], selected_year_range, country_col, value_col, ts_df)
     st.plotly_chart(fig, use_container_width=True)
 else:
     st.info("No time-series data detected for the selected indicator and dataset layout.")
@@ -138,10 +272,10 @@ else:
 st.markdown("---")
 
 # Scatter with regression
-st.subheader("Scatter plot with linear regression") 
+st.subheader("Scatter plot with linear regression")
 scatter_df = df_f[[country_col, x_indicator, y_indicator]].dropna()
 if not scatter_df.empty:
-    fig_scatter = px.scatter(scatter_df, x=x_indicator, y=y_indicator, hover_data=[country_col], trendline='ols', title=f"{y_indicator} vs {x_indicator}")
+    fig_scatter = scatter_fig(x_indicator, y_indicator, filter_key, country_col, scatter_df)
     st.plotly_chart(fig_scatter, use_container_width=True)
 else:
     st.info("Not enough data to build scatter plot.")
@@ -149,14 +283,11 @@ else:
 st.markdown("---")
 
 # Heatmap correlation
-st.subheader("Correlation heatmap") 
+st.subheader("Correlation heatmap")
 hm_inds = heatmap_inds[:12]
-corr_df = df_f[hm_inds].dropna()
-if not corr_df.empty and len(hm_inds) >= 2:
-    corr = corr_df.corr()
-    fig_hm = go.Figure(data=go.Heatmap(z=corr.values, x=corr.columns, y=corr.index, colorbar=dict(title='corr')))
-    fig_hm.update_layout(title='Indicator correlation heatmap')
-    st.plotly_chart(fig_hm, use_container_width=True)
+block_key = (tuple(hm_inds), filter_key)
+if len(hm_inds) >= 2 and len(indicator_block(*block_key, df_f)):
+    st.plotly_chart(heatmap_fig(*block_key, df_f), use_container_width=True)
 else:
     st.info("Not enough numeric indicators selected for heatmap.")
 
@@ -165,7 +296,7 @@ st.markdown("---")
 # Scatter matrix (pairwise)
 st.subheader("Scatter matrix (pairwise)")
 if len(hm_inds) >= 2:
-    fig_sm = px.scatter_matrix(df_f[hm_inds].dropna().iloc[:1000], dimensions=hm_inds, title='Pairwise scatter matrix (sample up to 1000 rows)')
+    fig_sm = scatter_matrix_fig(*block_key, df_f)
     st.plotly_chart(fig_sm, use_container_width=True)
 else:
     st.info("Select at least 2 indicators for the pairwise chart.")
@@ -174,7 +305,7 @@ st.markdown("---")
 
 # Data download
 st.subheader("Download filtered data")
-csv = df_f.to_csv(index=False).encode('utf-8')
+csv = to_csv_bytes(filter_key, df_f)
 st.download_button(label='Download CSV of filtered data', data=csv, file_name='wdi_filtered.csv', mime='text/csv')
 
 st.markdown("---")